@@ -1,4 +1,5 @@
 """Configuration management for OCR backend."""
+from functools import cached_property
 from pydantic_settings import BaseSettings
 from typing import List
 from pathlib import Path
@@ -81,9 +82,9 @@ class Settings(BaseSettings):
         case_sensitive = False
         extra = "ignore"
     
-    @property
+    @cached_property
     def origins_list(self) -> List[str]:
-        """Parse comma-separated origins into list"""
+        """Parse comma-separated origins into list (computed once per process)"""
         return [origin.strip() for origin in self.allowed_origins.split(",")]
 
 
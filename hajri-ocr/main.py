@@ -3,11 +3,16 @@ FastAPI OCR Backend for Hajri Attendance Tracker
 """
 from fastapi import FastAPI, File, UploadFile, HTTPException, Header, Form, Depends, Request, Body
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, HTMLResponse, RedirectResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import FileResponse, HTMLResponse, ORJSONResponse, RedirectResponse
+import asyncio
 import os
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import logging
 import json
+import orjson
 import time
 import base64
 import hmac
@@ -15,6 +20,8 @@ import hashlib
 import uuid
 from datetime import datetime, timezone
 from typing import Optional
+import cv2
+import numpy as np
 from dotenv import load_dotenv
 
 from config import settings
@@ -43,6 +50,9 @@ IS_PROD = ENV in {"prod", "production"}
 ENABLE_DEBUG_UI = _env_bool("ENABLE_DEBUG_UI", default=not IS_PROD)
 ENABLE_DOCS = _env_bool("ENABLE_DOCS", default=not IS_PROD)
 
+COURSE_CONFIG_PATH = APP_DIR / "course_config.json"
+MAX_UPLOAD_BYTES = settings.max_image_size_mb * 1024 * 1024
+
 ADMIN_COOKIE_NAME = "hajri_admin"
 ADMIN_SESSION_TTL_SECONDS = int(os.getenv("ADMIN_SESSION_TTL_SECONDS") or "28800")  # 8h
 
@@ -231,6 +241,9 @@ app = FastAPI(
     docs_url="/docs" if ENABLE_DOCS else None,
     redoc_url="/redoc" if ENABLE_DOCS else None,
     openapi_url="/openapi.json" if ENABLE_DOCS else None,
+    # orjson serializes the large OCR/debug payloads several times faster
+    # than stdlib json
+    default_response_class=ORJSONResponse,
 )
 
 
@@ -252,6 +265,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger JSON payloads (debug responses with the raw API result can
+# be hundreds of KB of highly redundant JSON)
+app.add_middleware(GZipMiddleware, minimum_size=1000, compresslevel=6)
+
 # Validate API credentials
 if not settings.paddleocr_vl_api_url or not settings.paddleocr_vl_api_token:
     raise RuntimeError("API credentials missing in .env")
@@ -300,20 +317,93 @@ extractor = TableExtractor(
 )
 
 
+# Pool for CPU-heavy sync work (image decode etc.). OpenCV releases the GIL,
+# so concurrent requests can use multiple cores instead of blocking the
+# event loop.
+_CPU_POOL = ThreadPoolExecutor(max_workers=os.cpu_count())
+
+# Separate pool for the hosted-OCR HTTP calls. These are network-bound and
+# can block for tens of seconds, so they get their own lane (they would
+# otherwise starve the CPU pool) with a small cap that doubles as a
+# concurrency limit against the upstream API.
+_OCR_POOL = ThreadPoolExecutor(max_workers=4)
+
+
+async def _read_upload_capped(file: UploadFile, max_bytes: int) -> bytearray:
+    """Read an upload in chunks, rejecting as soon as the cap is crossed
+
+    Avoids buffering an arbitrarily large body before the size check runs,
+    and hands the bytearray straight to the decoder (np.frombuffer accepts
+    it) instead of materializing an extra full-size bytes copy.
+    """
+    # Cheap pre-check from the multipart headers; the chunked loop below
+    # still enforces the cap for clients that lie about or omit the size.
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(400, f"File too large: exceeds {settings.max_image_size_mb}MB")
+
+    buf = bytearray()
+    while chunk := await file.read(64 * 1024):
+        buf += chunk
+        if len(buf) > max_bytes:
+            raise HTTPException(400, f"File too large: exceeds {settings.max_image_size_mb}MB")
+    return buf
+
+
+def _decode_image_bgr(image_bytes: bytes):
+    """Decode raw upload bytes to a BGR ndarray (None if undecodable)"""
+    nparr = np.frombuffer(image_bytes, np.uint8)
+    return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+
+
+# Parsed course_config.json, keyed on the file's mtime so repeat requests
+# skip the disk read + JSON parse while edits still apply without a restart.
+_course_db_cache: dict = {"mtime": None, "data": {}}
+
+
 def _load_course_db() -> dict:
-    """Load course mapping from course_config.json (best-effort)."""
+    """Load course mapping from course_config.json (best-effort, mtime-cached)."""
     try:
-        config_path = APP_DIR / "course_config.json"
+        config_path = COURSE_CONFIG_PATH
         if not config_path.exists():
+            _course_db_cache["mtime"] = None
+            _course_db_cache["data"] = {}
             return {}
+
+        mtime = config_path.stat().st_mtime_ns
+        if mtime == _course_db_cache["mtime"]:
+            return _course_db_cache["data"]
+
         with open(config_path, "r", encoding="utf-8") as f:
             cfg = json.load(f)
         courses = cfg.get("courses")
-        return courses if isinstance(courses, dict) else {}
+        courses = courses if isinstance(courses, dict) else {}
+        _course_db_cache["mtime"] = mtime
+        _course_db_cache["data"] = courses
+        return courses
     except Exception:
         return {}
 
 
+def _write_course_config(doc: dict) -> None:
+    """Persist the course config atomically and refresh in-memory state
+
+    Writes to a temp file and os.replace()s it into place so a crash never
+    leaves a truncated config, then updates the mtime cache and the
+    extractor's course map in place instead of re-reading and re-parsing
+    the file that was just written.
+    """
+    tmp_path = COURSE_CONFIG_PATH.with_suffix(".json.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(orjson.dumps(doc, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE))
+    os.replace(tmp_path, COURSE_CONFIG_PATH)
+
+    courses = doc.get("courses")
+    courses = courses if isinstance(courses, dict) else {}
+    _course_db_cache["mtime"] = COURSE_CONFIG_PATH.stat().st_mtime_ns
+    _course_db_cache["data"] = courses
+    extractor.course_db = courses
+
+
 # Load course map once at startup (endpoints will refresh as needed)
 extractor.course_db = _load_course_db()
 
@@ -597,7 +687,7 @@ async def upsert_course(code: str, payload: dict = Body(...)):
     if not abbr:
         raise HTTPException(status_code=400, detail="abbr is required")
 
-    config_path = APP_DIR / "course_config.json"
+    config_path = COURSE_CONFIG_PATH
     doc: dict = {}
     if config_path.exists():
         try:
@@ -617,13 +707,10 @@ async def upsert_course(code: str, payload: dict = Body(...)):
     doc["courses"] = courses
 
     try:
-        with open(config_path, "w", encoding="utf-8") as f:
-            json.dump(doc, f, ensure_ascii=False, indent=2)
-            f.write("\n")
+        _write_course_config(doc)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to write course_config.json: {e}")
 
-    extractor.course_db = _load_course_db()
     return {"ok": True, "code": course_code, "course": courses[course_code]}
 
 
@@ -634,7 +721,7 @@ async def delete_course(code: str):
     if not course_code:
         raise HTTPException(status_code=400, detail="Course code is required")
 
-    config_path = APP_DIR / "course_config.json"
+    config_path = COURSE_CONFIG_PATH
     if not config_path.exists():
         return {"ok": True, "deleted": False}
 
@@ -655,13 +742,10 @@ async def delete_course(code: str):
         courses.pop(course_code, None)
         doc["courses"] = courses
         try:
-            with open(config_path, "w", encoding="utf-8") as f:
-                json.dump(doc, f, ensure_ascii=False, indent=2)
-                f.write("\n")
+            _write_course_config(doc)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to write course_config.json: {e}")
 
-    extractor.course_db = _load_course_db()
     return {"ok": True, "deleted": deleted}
 
 
@@ -820,29 +904,27 @@ async def extract_attendance(file: UploadFile = File(...)):
         if not (file.content_type or "").startswith('image/'):
             raise HTTPException(400, "File must be an image")
         
-        # Read and validate file size
-        image_bytes = await file.read()
-        size_mb = len(image_bytes) / (1024 * 1024)
-        
-        if size_mb > settings.max_image_size_mb:
-            raise HTTPException(400, f"File too large: {size_mb:.2f}MB")
-        
-        # Decode image
-        import numpy as np
-        import cv2
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        # Read in capped chunks (rejects oversize uploads mid-stream)
+        image_bytes = await _read_upload_capped(file, MAX_UPLOAD_BYTES)
         
+        # Decode image off the event loop (imdecode releases the GIL)
+        image = await asyncio.get_running_loop().run_in_executor(
+            _CPU_POOL, _decode_image_bgr, image_bytes
+        )
+
         if image is None:
             raise HTTPException(400, "Invalid image file")
-        
-        logger.info(f"Image dimensions: {image.shape}")
+
+        logger.info("Image dimensions: %s", image.shape)
         
         # Refresh courses from disk so changes to course_config.json apply without restart
         extractor.course_db = _load_course_db()
 
-        # Extract using API
-        entries = extractor.extract_table_data(image)
+        # Extract using API (blocking HTTP call + HTML parsing; keep it off
+        # the event loop so concurrent uploads are not serialized)
+        entries = await asyncio.get_running_loop().run_in_executor(
+            _OCR_POOL, extractor.extract_table_data, image
+        )
         
         return OCRResponse(
             success=True,
@@ -853,7 +935,7 @@ async def extract_attendance(file: UploadFile = File(...)):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"OCR failed: {str(e)}")
+        logger.error("OCR failed: %s", e)
 
 
 @app.post("/ocr/extract/tuning", dependencies=[Depends(require_app_key)])
@@ -879,13 +961,12 @@ async def debug_extraction(
         if not (file.content_type or "").startswith('image/'):
             raise HTTPException(400, "File must be an image")
         
-        image_bytes = await file.read()
-        
-        import numpy as np
-        import cv2
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
+        image_bytes = await _read_upload_capped(file, MAX_UPLOAD_BYTES)
+
+        image = await asyncio.get_running_loop().run_in_executor(
+            _CPU_POOL, _decode_image_bgr, image_bytes
+        )
+
         if image is None:
             raise HTTPException(400, "Invalid image file")
         
@@ -926,9 +1007,11 @@ async def debug_extraction(
         request_payload_sanitized["file"] = "<base64 omitted>"
         request_payload_sanitized["file_base64_length"] = len(file_data)
 
-        # Call API directly
+        # Call API directly (off the event loop; requests.post blocks)
         t0 = time.perf_counter()
-        api_result = debug_extractor._call_api(image, file_data=file_data)
+        api_result = await asyncio.get_running_loop().run_in_executor(
+            _OCR_POOL, partial(debug_extractor._call_api, image, file_data=file_data)
+        )
         server_latency_ms = int((time.perf_counter() - t0) * 1000)
         
         # Get markdown
@@ -965,5 +1048,17 @@ async def debug_extraction(
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # uvicorn[standard] bundles uvloop + httptools; request them explicitly so a
+    # stripped install fails loudly instead of silently falling back to
+    # asyncio/h11. Workers default to one per pair of cores (WEB_CONCURRENCY
+    # overrides) so CPU-bound decode/preprocess work spreads across processes.
+    uvicorn.run(
+        "main:app",
+        host=settings.host,
+        port=settings.port,
+        workers=int(os.environ.get("WEB_CONCURRENCY", max(2, (os.cpu_count() or 2) // 2))),
+        loop="uvloop",
+        http="httptools",
+        log_level=os.environ.get("LOG_LEVEL", "info").lower(),
+    )
 
@@ -2,13 +2,20 @@
 PaddleOCR-VL API-based Table Extraction
 Uses Baidu's hosted PaddleOCR-VL API for document analysis
 """
+import os
 import re
 import logging
 import base64
 import difflib
+import hashlib
+import threading
 import requests
-from typing import List, Optional, Dict, Any
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Dict, Any, Tuple
+from bs4 import BeautifulSoup, SoupStrainer
 import numpy as np
 import cv2
 
@@ -16,6 +23,89 @@ from models import AttendanceEntry
 
 logger = logging.getLogger(__name__)
 
+# Prefer RapidFuzz's C++ ratio for fuzzy course-name matching; fall back to
+# stdlib difflib when it is not installed.
+try:
+    from rapidfuzz import fuzz as _rf_fuzz
+except ImportError:
+    _rf_fuzz = None
+
+# Parse table HTML with lxml directly when available (C-level tree walk, no
+# per-cell soup Tag allocation); fall back to BeautifulSoup + the stdlib
+# parser so the module stays importable without lxml.
+try:
+    from lxml import etree as _lxml_etree
+    _BS4_PARSER = 'lxml'
+except ImportError:
+    _lxml_etree = None
+    _BS4_PARSER = 'html.parser'
+
+# Only the <table> subtrees are ever read, so skip building soup nodes for
+# the surrounding markdown prose entirely.
+_ONLY_TABLES = SoupStrainer('table')
+
+
+def _tables_as_text(markdown_text: str) -> List[List[Tuple[List[str], List[str]]]]:
+    """Extract all tables as plain text: rows of (th+td texts, td-only texts)
+
+    The parsers only ever read cell text, so the tree is flattened in one
+    pass here — via lxml XPath when available, else BeautifulSoup — and the
+    row logic downstream works on lists of strings.
+    """
+    tables_text: List[List[Tuple[List[str], List[str]]]] = []
+    if _lxml_etree is not None:
+        tree = _lxml_etree.HTML(markdown_text)
+        if tree is None:
+            return tables_text
+        for table in tree.xpath('//table'):
+            rows = []
+            for tr in table.xpath('.//tr'):
+                all_texts: List[str] = []
+                td_texts: List[str] = []
+                for cell in tr.xpath('./th|./td'):
+                    text = ''.join(t.strip() for t in cell.itertext())
+                    all_texts.append(text)
+                    if cell.tag == 'td':
+                        td_texts.append(text)
+                rows.append((all_texts, td_texts))
+            tables_text.append(rows)
+        return tables_text
+
+    soup = BeautifulSoup(markdown_text, _BS4_PARSER, parse_only=_ONLY_TABLES)
+    for table in soup.find_all('table'):
+        rows = []
+        for tr in table.find_all('tr'):
+            all_texts = []
+            td_texts = []
+            for cell in tr.find_all(['th', 'td']):
+                text = cell.get_text(strip=True)
+                all_texts.append(text)
+                if cell.name == 'td':
+                    td_texts.append(text)
+            rows.append((all_texts, td_texts))
+        tables_text.append(rows)
+    return tables_text
+
+
+# Row-parsing patterns, compiled once at import
+_RE_FRACTION = re.compile(r'\b\d+\s*/\s*\d+\b')
+_RE_HAS_LETTERS = re.compile(r'[A-Za-z]{3,}')
+_RE_COURSE_CODE = re.compile(r'\b([A-Z]+\d+)\b')
+_RE_CODE_NAME = re.compile(r'^\s*([A-Z]+\d+)\s*[:\-]\s*(.+?)\s*$')
+_RE_CODE_PREFIX = re.compile(r'([A-Z]+\d+)')
+_RE_ABBR = re.compile(r'/\s*([A-Za-z0-9\-]+)')
+_RE_ATTENDANCE = re.compile(r'(\d+)\s*/\s*(\d+)')
+_RE_NONALNUM = re.compile(r'[^A-Z0-9\s]+')
+_RE_WS = re.compile(r'\s+')
+
+
+def _norm(s: str) -> str:
+    """Upper, collapse whitespace, drop punctuation for more stable matching"""
+    s = (s or "").upper()
+    s = _RE_NONALNUM.sub(' ', s)
+    s = _RE_WS.sub(' ', s).strip()
+    return s
+
 
 class TableExtractor:
     """
@@ -33,19 +123,75 @@ class TableExtractor:
         self.course_db: Dict[str, Any] = {}
         # Used when matching OCR course names/abbrs to configured courses
         self.course_fuzzy_match_threshold: float = 0.75
-    
+        # Cap the longest side before upload; 2K+ phone screenshots just cost
+        # encode time and payload bytes — the API resizes internally anyway.
+        self.auto_downscale: bool = True
+        self.max_upload_side: int = 1920
+        # API results keyed by image content hash; retries and the debug
+        # console's preview-then-submit flow resend identical frames, and a
+        # hit skips the whole encode + network round trip. Results are small
+        # (markdown text), so a handful of entries cost little.
+        self._api_cache: "OrderedDict[bytes, Dict]" = OrderedDict()
+        self._api_cache_cap: int = 32
+        # Persistent session: keep-alive skips the TCP+TLS handshake on every
+        # call after the first, and transient upstream errors get retried.
+        # Retrying POST is safe here — extraction is idempotent.
+        self._session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=8,
+            max_retries=Retry(
+                total=2,
+                backoff_factor=0.3,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset({"POST"}),
+            ),
+        )
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        # api_options are fixed per instance, so merge them into the request
+        # payload once here; per call only the "file" field changes.
+        self._payload_template = self._make_payload_template()
+
+    def close(self) -> None:
+        """Release pooled HTTP connections"""
+        self._session.close()
+
+    def _prepare_image(self, image: np.ndarray) -> np.ndarray:
+        """Downscale oversized images before encoding for upload
+
+        Output is markdown (no pixel coordinates come back), so shrinking the
+        input only reduces encode work, base64 payload size and upstream
+        latency without any remapping.
+        """
+        if not self.auto_downscale:
+            return image
+        longest = max(image.shape[:2])
+        if longest <= self.max_upload_side:
+            return image
+        scale = self.max_upload_side / longest
+        return cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
     def _encode_image(self, image: np.ndarray) -> str:
-        """Encode image to base64 string"""
-        _, buffer = cv2.imencode('.png', image)
-        return base64.b64encode(buffer.tobytes()).decode('ascii')
+        """Encode image to base64 string
 
-    def _build_payload(self, *, file_data: str) -> Dict[str, Any]:
-        """Build PaddleOCR PP-Structure layout-parsing payload."""
-        required_payload: Dict[str, Any] = {
-            "file": file_data,
-            "fileType": 1,  # image
-        }
+        JPEG q=90 instead of PNG: visually equivalent for screenshot OCR but
+        several times smaller and much cheaper to encode than zlib, which
+        shrinks the request body accordingly.
+        """
+        ok, buffer = cv2.imencode('.jpg', image, [int(cv2.IMWRITE_JPEG_QUALITY), 90])
+        if not ok:
+            _, buffer = cv2.imencode('.png', image)
+        # b64encode reads the ndarray through the buffer protocol, skipping
+        # the intermediate tobytes() copy of the multi-MB encode buffer.
+        return base64.b64encode(buffer).decode('ascii')
 
+    def _make_payload_template(self) -> Dict[str, Any]:
+        """Build the constant part of the PP-Structure layout-parsing payload
+
+        Everything except the per-call "file" field is static for the lifetime
+        of the extractor, so it is merged once at init instead of per request.
+        """
         # Default optional payload aligned with PaddleOCR PP-Structure layout-parsing API.
         optional_payload: Dict[str, Any] = {
             "markdownIgnoreLabels": [
@@ -100,12 +246,25 @@ class TableExtractor:
             if v is not None:
                 optional_payload[k] = v
 
-        return {**required_payload, **optional_payload}
+        return {"fileType": 1, **optional_payload}  # fileType 1 = image
+
+    def _build_payload(self, *, file_data: str) -> Dict[str, Any]:
+        """Attach the per-call file data to the prebuilt payload template."""
+        return {**self._payload_template, "file": file_data}
     
     def _call_api(self, image: np.ndarray, *, file_data: Optional[str] = None) -> Dict:
-        """Call PaddleOCR-VL API"""
-        file_data = file_data or self._encode_image(image)
-        
+        """Call PaddleOCR-VL API (content-hash cached on the default path)"""
+        cache_key = None
+        if file_data is None:
+            prepared = self._prepare_image(image)
+            cache_key = hashlib.blake2b(prepared.tobytes(), digest_size=16).digest()
+            cached = self._api_cache.get(cache_key)
+            if cached is not None:
+                self._api_cache.move_to_end(cache_key)
+                logger.info("API result served from content-hash cache")
+                return cached
+            file_data = self._encode_image(prepared)
+
         headers = {
             "Authorization": f"token {self.api_token}",
             "Content-Type": "application/json"
@@ -113,7 +272,8 @@ class TableExtractor:
         
         payload = self._build_payload(file_data=file_data)
         
-        response = requests.post(self.api_url, json=payload, headers=headers, timeout=60)
+        response = self._session.post(self.api_url, json=payload, headers=headers,
+                                      timeout=(5, 60))
         
         if response.status_code != 200:
             raise RuntimeError(f"API error: {response.status_code}")
@@ -121,7 +281,11 @@ class TableExtractor:
         result = response.json()
         if result.get("errorCode") != 0:
             raise RuntimeError(f"API error: {result.get('errorMsg')}")
-        
+
+        if cache_key is not None:
+            self._api_cache[cache_key] = result["result"]
+            if len(self._api_cache) > self._api_cache_cap:
+                self._api_cache.popitem(last=False)
         return result["result"]
     
     def _parse_markdown_to_entries(self, markdown_text: str) -> List[AttendanceEntry]:
@@ -137,16 +301,15 @@ class TableExtractor:
         entries = []
         
         try:
-            soup = BeautifulSoup(markdown_text, 'html.parser')
-            tables = soup.find_all('table')
-            
-            logger.info(f"Found {len(tables)} tables in markdown")
+            tables = _tables_as_text(markdown_text)
+
+            logger.info("Found %d tables in markdown", len(tables))
             
             if not tables:
                 return entries
 
             def _is_attendance_fraction(text: str) -> bool:
-                return bool(re.search(r'\b\d+\s*/\s*\d+\b', text or ""))
+                return bool(_RE_FRACTION.search(text or ""))
 
             def _looks_like_course_name(text: str) -> bool:
                 if not text:
@@ -158,7 +321,7 @@ class TableExtractor:
                 if t.upper() in {"LECT", "LAB", "TUT", "PRACT", "PRACTICAL", "THEORY"}:
                     return False
                 # Needs some letters to be a plausible name
-                if not re.search(r'[A-Za-z]{3,}', t):
+                if not _RE_HAS_LETTERS.search(t):
                     return False
                 # Avoid short single tokens (e.g., LECT/OOP/FSE) unless they look like a real title.
                 # Course titles almost always have spaces OR are long enough.
@@ -167,7 +330,7 @@ class TableExtractor:
             def _extract_course_code(text: str) -> Optional[str]:
                 if not text:
                     return None
-                code_match = re.search(r'\b([A-Z]+\d+)\b', text.strip())
+                code_match = _RE_COURSE_CODE.search(text.strip())
                 return code_match.group(1) if code_match else None
 
             # Build a course name lookup from tables OTHER than the attendance table.
@@ -176,12 +339,10 @@ class TableExtractor:
             course_names: Dict[str, str] = {}
 
             for t in tables[1:]:
-                for row in t.find_all('tr'):
+                for texts, _ in t:
                     # Consider both th and td to catch small "code/name" reference tables
-                    cells = row.find_all(['th', 'td'])
-                    if len(cells) < 2:
+                    if len(texts) < 2:
                         continue
-                    texts = [c.get_text(strip=True) for c in cells]
 
                     # Scan adjacent pairs for a (code, name) pattern.
                     for i in range(len(texts) - 1):
@@ -196,60 +357,110 @@ class TableExtractor:
                     for text in texts:
                         if not text:
                             continue
-                        m = re.match(r'^\s*([A-Z]+\d+)\s*[:\-]\s*(.+?)\s*$', text)
+                        m = _RE_CODE_NAME.match(text)
                         if m and _looks_like_course_name(m.group(2)):
                             course_names.setdefault(m.group(1), m.group(2))
             
             # Process first table (attendance table)
-            table = tables[0]
-            rows = table.find_all('tr')
-            
+            rows = tables[0]
+
             if len(rows) < 2:
                 logger.warning("Table has no data rows")
                 return entries
             
             # Also learn from the right-side columns (cols 4-5) of the attendance table when present.
-            for row in rows[1:]:  # Skip header
-                cells = row.find_all('td')
+            for _, cells in rows[1:]:  # Skip header
                 if len(cells) >= 6:
-                    right_course_code_text = cells[4].get_text(strip=True)
-                    right_course_name = cells[5].get_text(strip=True)
-                    
+                    right_course_code_text = cells[4]
+                    right_course_name = cells[5]
+
                     # Extract course code (e.g., "CEUE203 / OOP" -> "CEUE203")
                     code = _extract_course_code(right_course_code_text)
                     if code and right_course_name:
                         course_names.setdefault(code, right_course_name)
             
+            # Build config indexes once for the whole table (code -> name/abbr,
+            # abbr -> codes); these only depend on course_db, not on the row.
+            config_courses: Dict[str, Dict[str, str]] = {}
+            abbr_to_codes: Dict[str, List[str]] = {}
+            config_norm_names: Dict[str, str] = {}
+            if isinstance(getattr(self, 'course_db', None), dict):
+                for code, val in self.course_db.items():
+                    if not isinstance(code, str):
+                        continue
+                    if isinstance(val, str):
+                        name = val
+                        abbr = ""
+                    elif isinstance(val, dict):
+                        name = (val.get('name') or val.get('course_name') or val.get('title') or "")
+                        abbr = (val.get('abbr') or "")
+                    else:
+                        continue
+                    code_u = code.strip().upper()
+                    name = name.strip()
+                    abbr_u = abbr.strip().upper()
+                    if not code_u:
+                        continue
+                    config_courses[code_u] = {"name": name, "abbr": abbr_u}
+                    config_norm_names[code_u] = _norm(name)
+                    if abbr_u:
+                        abbr_to_codes.setdefault(abbr_u, []).append(code_u)
+
+            def _best_name_match(ocr_name: str) -> Optional[str]:
+                """Return best matching course code from config based on OCR name."""
+                if not ocr_name or not config_courses:
+                    return None
+                o = _norm(ocr_name)
+                if not o:
+                    return None
+                best_code = None
+                best_score = 0.0
+                for code_u, cn in config_norm_names.items():
+                    if not cn:
+                        continue
+                    # Fast path for truncation: OCR name is a prefix/substr of full
+                    # config name. A perfect score cannot be beaten, so return now
+                    # instead of sweeping the remaining candidates.
+                    if cn.startswith(o) or (o in cn and len(o) >= 12):
+                        return code_u
+                    if _rf_fuzz is not None:
+                        score = _rf_fuzz.ratio(o, cn) / 100.0
+                    else:
+                        score = difflib.SequenceMatcher(a=o, b=cn).ratio()
+                    if score > best_score:
+                        best_score = score
+                        best_code = code_u
+
+                threshold = getattr(self, 'course_fuzzy_match_threshold', 0.75)
+                return best_code if best_code and best_score >= float(threshold) else None
+
             # Now parse attendance data from left-side columns (cols 0-3)
-            for row_idx, row in enumerate(rows[1:], 1):
-                cells = row.find_all('td')
-                
+            for row_idx, (_, cells) in enumerate(rows[1:], 1):
                 if len(cells) < 4:
                     continue
-                
+
                 # Extract: Course | Class Type | Present/Total | Percentage
-                course_text = cells[0].get_text(strip=True)
-                class_type = cells[1].get_text(strip=True)
-                attendance_text = cells[2].get_text(strip=True)
+                course_text = cells[0]
+                class_type = cells[1]
+                attendance_text = cells[2]
                 
                 # Parse course code (e.g., "CEUC201 / FSE" -> "CEUC201")
-                course_code_match = re.match(r'([A-Z]+\d+)', course_text)
+                course_code_match = _RE_CODE_PREFIX.match(course_text)
                 if not course_code_match:
                     continue
                 extracted_course_code = course_code_match.group(1)
 
                 # Parse course abbr (e.g., "CEUC201 / FSE" -> "FSE")
                 extracted_abbr = None
-                abbr_match = re.search(r'/\s*([A-Za-z0-9\-]+)', course_text)
+                abbr_match = _RE_ABBR.search(course_text)
                 if abbr_match:
                     extracted_abbr = abbr_match.group(1).strip().upper()
                 
                 # Parse attendance (e.g., "28 / 39" -> present=28, total=39)
-                attendance_pattern = re.compile(r'(\d+)\s*/\s*(\d+)')
-                attendance_match = attendance_pattern.search(attendance_text)
+                attendance_match = _RE_ATTENDANCE.search(attendance_text)
                 
                 if not attendance_match:
-                    logger.warning(f"Row {row_idx}: Cannot parse attendance '{attendance_text}'")
+                    logger.warning("Row %d: Cannot parse attendance '%s'", row_idx, attendance_text)
                     continue
                 
                 present = int(attendance_match.group(1))
@@ -260,62 +471,6 @@ class TableExtractor:
                 course_name_source = "unknown"
                 ocr_course_name = course_names.get(extracted_course_code)
 
-                # Build config indexes (code -> name/abbr, abbr -> codes)
-                config_courses: Dict[str, Dict[str, str]] = {}
-                abbr_to_codes: Dict[str, List[str]] = {}
-                if isinstance(getattr(self, 'course_db', None), dict):
-                    for code, val in self.course_db.items():
-                        if not isinstance(code, str):
-                            continue
-                        if isinstance(val, str):
-                            name = val
-                            abbr = ""
-                        elif isinstance(val, dict):
-                            name = (val.get('name') or val.get('course_name') or val.get('title') or "")
-                            abbr = (val.get('abbr') or "")
-                        else:
-                            continue
-                        code_u = code.strip().upper()
-                        name = name.strip()
-                        abbr_u = abbr.strip().upper()
-                        if not code_u:
-                            continue
-                        config_courses[code_u] = {"name": name, "abbr": abbr_u}
-                        if abbr_u:
-                            abbr_to_codes.setdefault(abbr_u, []).append(code_u)
-
-                def _norm(s: str) -> str:
-                    # Upper, collapse whitespace, drop punctuation for more stable matching
-                    s = (s or "").upper()
-                    s = re.sub(r'[^A-Z0-9\s]+', ' ', s)
-                    s = re.sub(r'\s+', ' ', s).strip()
-                    return s
-
-                def _best_name_match(ocr_name: str) -> Optional[str]:
-                    """Return best matching course code from config based on OCR name."""
-                    if not ocr_name or not config_courses:
-                        return None
-                    o = _norm(ocr_name)
-                    if not o:
-                        return None
-                    best_code = None
-                    best_score = 0.0
-                    for code_u, meta in config_courses.items():
-                        cn = _norm(meta.get('name') or "")
-                        if not cn:
-                            continue
-                        # Fast path for truncation: OCR name is a prefix/substr of full config name
-                        if cn.startswith(o) or (o in cn and len(o) >= 12):
-                            score = 1.0
-                        else:
-                            score = difflib.SequenceMatcher(a=o, b=cn).ratio()
-                        if score > best_score:
-                            best_score = score
-                            best_code = code_u
-
-                    threshold = getattr(self, 'course_fuzzy_match_threshold', 0.75)
-                    return best_code if best_code and best_score >= float(threshold) else None
-
                 resolved_course_code = extracted_course_code
                 resolved_shortname = extracted_abbr or ""
 
@@ -368,7 +523,8 @@ class TableExtractor:
                 ))
         
         except Exception as e:
-            logger.error(f"Error parsing HTML tables: {e}", exc_info=True)
+            logger.error("Error parsing HTML tables: %s", e,
+                         exc_info=logger.isEnabledFor(logging.DEBUG))
         
         return entries
     
@@ -389,17 +545,36 @@ class TableExtractor:
                 logger.warning("Empty markdown output")
                 return []
             
-            # Save markdown for debugging
-            with open("last_markdown.txt", "w", encoding="utf-8") as f:
+            # Save markdown for debugging. Written via a thread-unique temp
+            # file + os.replace so concurrent extractions (batch API, pooled
+            # requests) never interleave in the dump; last writer wins intact.
+            tmp_path = f"last_markdown.txt.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
                 f.write(markdown_text)
+            os.replace(tmp_path, "last_markdown.txt")
             
-            logger.info(f"Step 2: Parsing markdown ({len(markdown_text)} chars)...")
+            logger.info("Step 2: Parsing markdown (%d chars)...", len(markdown_text))
             
             entries = self._parse_markdown_to_entries(markdown_text)
             
-            logger.info(f"✅ Extracted {len(entries)} attendance entries")
+            logger.info("✅ Extracted %d attendance entries", len(entries))
             return entries
             
         except Exception as e:
-            logger.error(f"Extraction failed: {e}", exc_info=True)
+            logger.error("Extraction failed: %s", e,
+                         exc_info=logger.isEnabledFor(logging.DEBUG))
+            return []
+
+    def extract_table_data_batch(self, images: List[np.ndarray],
+                                 max_workers: int = 4) -> List[List[AttendanceEntry]]:
+        """Extract entries for several images with concurrent API calls
+
+        The per-image work is dominated by the network round trip, so a small
+        thread pool overlaps requests while the pooled session reuses
+        connections; max_workers caps in-flight calls to stay within upstream
+        rate limits. Results are returned in input order.
+        """
+        if not images:
             return []
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(images))) as pool:
+            return list(pool.map(self.extract_table_data, images))